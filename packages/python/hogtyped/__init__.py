@@ -25,7 +25,13 @@ Example:
     )
 """
 
-from .codegen import generate_wrapper
-
 __version__ = "0.1.0"
-__all__ = ["generate_wrapper"]
\ No newline at end of file
+__all__ = ["generate_wrapper"]
+
+
+def __getattr__(name):
+    # Import the generator on first use so `python -m hogtyped init` doesn't load it
+    if name == "generate_wrapper":
+        from .codegen import generate_wrapper
+        return generate_wrapper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
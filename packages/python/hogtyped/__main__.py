@@ -4,11 +4,13 @@ CLI for HogTyped Python code generation.
 """
 
 import argparse
+import os
 import sys
-from .codegen import generate_wrapper
+from typing import List, Optional
 
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the CLI with the given arguments (defaults to sys.argv) and return its exit code."""
     parser = argparse.ArgumentParser(
         prog='hogtyped',
         description='Generate a type-safe PostHog wrapper with embedded schemas'
@@ -42,6 +44,11 @@ def main():
         choices=['strict', 'warning', 'disabled'],
         help='Default validation mode (default: warning)'
     )
+    generate_parser.add_argument(
+        '-f', '--force',
+        action='store_true',
+        help='Regenerate even if the output is up to date'
+    )
 
     # Init command
     init_parser = subparsers.add_parser(
@@ -49,9 +56,12 @@ def main():
         help='Initialize HogTyped in your project'
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.command == 'generate':
+        # Imported here so other commands don't pay for loading the generator
+        from .codegen import generate_wrapper
+
         print('🐗 HogTyped Generator (Python)\n')
 
         try:
@@ -59,7 +69,8 @@ def main():
                 schemas=args.schemas,
                 output=args.output,
                 class_name=args.class_name,
-                validation_mode=args.mode
+                validation_mode=args.mode,
+                force=args.force
             )
 
             print(f'\n📝 Next steps:')
@@ -74,10 +85,9 @@ def main():
 
         except Exception as e:
             print(f'❌ Error generating wrapper: {e}', file=sys.stderr)
-            sys.exit(1)
+            return 1
 
     elif args.command == 'init':
-        import os
         import json
 
         print('🐗 Initializing HogTyped...\n')
@@ -120,6 +130,8 @@ def main():
     else:
         parser.print_help()
 
+    return 0
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -4,42 +4,128 @@ Code generator for HogTyped Python wrapper.
 Generates a Python module with embedded schemas and type hints.
 """
 
+import hashlib
 import json
+import keyword
 import os
+import re
+import stat
+import tempfile
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import glob as glob_module
 
+_json_loads: Callable[[bytes], Any]
+try:
+    import orjson
+except ImportError:  # orjson is optional, see the "fast" extra
+    _json_loads = json.loads
+else:
+    def _orjson_loads(raw: bytes) -> Any:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN/Infinity and integers beyond 64 bits, which json
+            # accepts; the same schemas must load with or without the extra
+            return json.loads(raw)
+
+    _json_loads = _orjson_loads
+
+# Regexes for the string formats checked by generated validators, keyed by
+# JSON Schema format name: (constant name in the generated module, pattern)
+FORMAT_PATTERNS = {
+    # Domain labels exclude dots, so there is one way to split a domain and no backtracking
+    'email': ('_EMAIL_RE', r'[^@\s]+@[^@\s.]+(?:\.[^@\s.]+)+'),
+    'uri': ('_URI_RE', r'[A-Za-z][A-Za-z0-9+.\-]*:[^\s]*'),
+}
+
+# JSON strings are matched first so that words and brackets inside them are never rewritten
+_JSON_STRING = r'"(?:[^"\\]|\\.)*"'
+_LITERAL_RE = re.compile(
+    rf'({_JSON_STRING})|\b(true|false|null)\b|\[\s+((?:{_JSON_STRING}|[^\[{{\]"])+?)\s+\]'
+)
+_ARRAY_ITEM_RE = re.compile(rf'({_JSON_STRING})|\b(true|false|null)\b|\s+')
+_PYTHON_LITERALS = {'true': 'True', 'false': 'False', 'null': 'None'}
+
+# Characters that can't appear in Python identifiers
+_NON_IDENTIFIER_RE = re.compile(r'\W')
+
+# First line of every generated file, followed by the hash of its inputs
+HASH_HEADER = "# hogtyped-hash: "
+
+# Argument names used by the generated capture_<event> methods themselves
+RESERVED_ARGUMENT_NAMES = frozenset({'self', 'distinct_id', 'properties', 'kwargs'})
+
+# Keyword arguments capture_<event> forwards to posthog.capture(); properties with these
+# names get a trailing underscore so the client options keep working
+CLIENT_CAPTURE_ARGUMENTS = frozenset({
+    'timestamp', 'uuid', 'groups', 'context', 'flags', 'send_feature_flags', 'disable_geoip',
+})
+
+# capture_* methods of the generated class that a capture_<event> method must not replace
+RESERVED_METHOD_NAMES = frozenset({'capture_many'})
+
 
 def generate_wrapper(
-    schemas: str,
+    schemas: Union[str, List[str]],
     output: str = "./posthog_generated.py",
     class_name: str = "PostHog",
-    validation_mode: str = "warning"
+    validation_mode: str = "warning",
+    force: bool = False
 ) -> None:
     """
     Generate a Python wrapper with embedded schemas and type hints.
 
     Args:
-        schemas: Glob pattern for schema files
+        schemas: Glob pattern for schema files, or a list of schema file paths
         output: Output file path
         class_name: Name of the generated class
         validation_mode: Default validation mode (strict/warning/disabled)
+        force: Regenerate even if the output is already up to date
     """
 
     # Load and process schemas
     schema_data = load_schemas(schemas)
 
+    # Skip regeneration when the output was built from the same inputs
+    input_hash = compute_input_hash(schema_data, class_name, validation_mode)
+    output_path = Path(output)
+    if not force and read_output_hash(output_path) == input_hash:
+        print(f"✅ {class_name} wrapper at {output} is up to date")
+        return
+
     # Generate Python code
-    code = generate_python_code(schema_data, class_name, validation_mode)
+    code = f"{HASH_HEADER}{input_hash}\n" + generate_python_code(schema_data, class_name, validation_mode)
 
     # Ensure output directory exists
-    output_path = Path(output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Write the generated file
-    output_path.write_text(code)
+    # Write the generated file as UTF-8 regardless of locale, via a temporary file so
+    # an interrupted run never leaves a half-written module behind. The temporary name
+    # is unique so concurrent runs into the same output don't share it
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(code.encode("utf-8"))
+
+        # mkstemp() creates the file readable by its owner only; keep the mode of the
+        # file being replaced, or use the usual mode for a new module
+        try:
+            mode = stat.S_IMODE(os.stat(output_path).st_mode)
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
     print(f"✅ Generated {class_name} wrapper at {output}")
     print(f"   - {len(schema_data)} events with full type hints")
@@ -47,18 +133,82 @@ def generate_wrapper(
     print(f"   - Type checking with mypy/pyright")
 
 
-def load_schemas(pattern: str) -> List[Dict[str, Any]]:
-    """Load and process JSON schema files."""
-    schema_files = sorted(glob_module.glob(pattern, recursive=True))
+def compute_input_hash(schemas: List[Dict[str, Any]], class_name: str, validation_mode: str) -> str:
+    """Hash everything the generated output depends on.
+
+    Uses the resolved schemas, so changes to externally referenced files are
+    picked up, plus the generator's own source and the CLI options.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(Path(__file__).read_bytes())
+    # Key order is kept: it sets the order of fields, arguments and checks in the output
+    hasher.update(json.dumps(schemas).encode())
+    hasher.update(repr((class_name, validation_mode)).encode())
+    return hasher.hexdigest()
+
+
+def read_output_hash(output_path: Path) -> Optional[str]:
+    """Return the input hash recorded in a previously generated file, if any."""
+    # Read as bytes: older outputs may not be UTF-8 (e.g. written in a cp1252 locale),
+    # and those should be regenerated rather than fail to decode
+    try:
+        with open(output_path, 'rb') as f:
+            first_line = f.readline()
+    except OSError:
+        return None
+
+    header = HASH_HEADER.encode()
+    if not first_line.startswith(header):
+        return None
+    return first_line[len(header):].strip().decode('ascii', errors='replace')
+
+
+def load_schemas(pattern: Union[str, List[str]]) -> List[Dict[str, Any]]:
+    """Load and process JSON schema files from a glob pattern or a list of paths."""
+    if isinstance(pattern, str):
+        # glob lists each directory with a single os.scandir() pass and matches names
+        # with fnmatch, without a stat per file, and keeps `**` and hidden-file rules
+        matched_files = sorted(glob_module.glob(pattern, recursive=True))
+    else:
+        # Callers that already know their files skip the directory listing
+        matched_files = list(pattern)
+
+    # Symlinks can make the same file match more than once; load each one once
+    schema_files = []
+    seen_files = set()
+    for file_path in matched_files:
+        real_path = os.path.realpath(file_path)
+        if real_path not in seen_files:
+            seen_files.add(real_path)
+            schema_files.append(file_path)
+
     schemas = []
 
-    for file_path in schema_files:
-        with open(file_path, 'r') as f:
-            content = json.load(f)
+    # Referenced files may have changed since a previous call in this process. For
+    # the same reason results aren't memoized across calls: a key built from the
+    # matched files' mtimes would miss edits to $ref targets
+    _load_ref_file.cache_clear()
+
+    # Reads release the GIL, so fetch all files concurrently. Parsing holds it (both
+    # json and orjson), so parsing and ref resolution stay on this thread
+    if len(schema_files) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(schema_files))) as executor:
+            raw_files = list(executor.map(_read_bytes, schema_files))
+    else:
+        raw_files = [_read_bytes(file_path) for file_path in schema_files]
+
+    for file_path, raw in zip(schema_files, raw_files):
+        content = _json_loads(raw)
+
+        # Files without references or merges can skip the walk entirely
+        needs_resolve = b'"$ref"' in raw or b'"allOf"' in raw
 
         if 'events' in content:
             for event_name, event_schema in content['events'].items():
-                resolved = resolve_refs(event_schema, content, file_path)
+                if needs_resolve:
+                    resolved = resolve_refs(event_schema, content, file_path)
+                else:
+                    resolved = event_schema
                 schemas.append({
                     'event_name': event_name,
                     'type_name': event_name_to_type(event_name),
@@ -71,6 +221,18 @@ def load_schemas(pattern: str) -> List[Dict[str, Any]]:
     return sorted(schemas, key=lambda x: x['event_name'], reverse=True)
 
 
+def _read_bytes(file_path: str) -> bytes:
+    """Read a schema file as raw bytes."""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def _load_ref_file(file_path: str) -> Any:
+    """Parse an externally referenced schema file, once per load_schemas() call."""
+    return _json_loads(_read_bytes(file_path))
+
+
 def resolve_refs(schema: Any, root_schema: Dict, file_path: str) -> Any:
     """Resolve JSON Schema $ref references."""
     if not schema:
@@ -95,8 +257,7 @@ def resolve_refs(schema: Any, root_schema: Dict, file_path: str) -> Any:
                 ref_parts = ref.split('#')
                 ref_file = Path(file_path).parent / ref_parts[0]
 
-                with open(ref_file, 'r') as f:
-                    ref_content = json.load(f)
+                ref_content = _load_ref_file(str(ref_file.resolve()))
 
                 if len(ref_parts) > 1 and ref_parts[1]:
                     ref_fragment = ref_parts[1][1:].split('/')
@@ -121,15 +282,31 @@ def resolve_refs(schema: Any, root_schema: Dict, file_path: str) -> Any:
                     if 'additionalProperties' in resolved:
                         merged['additionalProperties'] = resolved['additionalProperties']
 
-            merged['required'] = list(set(merged['required']))
+            merged['required'] = list(dict.fromkeys(merged['required']))
             return merged
 
         else:
-            # Recursively resolve nested schemas
-            return {k: resolve_refs(v, root_schema, file_path) for k, v in schema.items()}
+            # Recursively resolve nested schemas, copying only the dicts that change;
+            # unchanged subtrees are shared since the generator only reads them
+            resolved_dict = None
+            for key, value in schema.items():
+                if not isinstance(value, (dict, list)):
+                    continue
+                resolved = resolve_refs(value, root_schema, file_path)
+                if resolved is not value:
+                    if resolved_dict is None:
+                        resolved_dict = dict(schema)
+                    resolved_dict[key] = resolved
+            return schema if resolved_dict is None else resolved_dict
 
     elif isinstance(schema, list):
-        return [resolve_refs(item, root_schema, file_path) for item in schema]
+        resolved_list = [
+            resolve_refs(item, root_schema, file_path) if isinstance(item, (dict, list)) else item
+            for item in schema
+        ]
+        if all(new is old for new, old in zip(resolved_list, schema)):
+            return schema
+        return resolved_list
 
     return schema
 
@@ -140,6 +317,13 @@ def event_name_to_type(event_name: str) -> str:
     return ''.join(word.capitalize() for word in parts) + 'Properties'
 
 
+def event_name_to_identifier(event_name: str) -> str:
+    """Convert event name to a string usable in Python identifiers."""
+    return _NON_IDENTIFIER_RE.sub('_', event_name)
+
+
+# Not memoized: schemas are unhashable dicts, and building a key for them (e.g. with
+# json.dumps) costs several times more than this conversion does
 def json_schema_to_python_type(schema: Any) -> str:
     """Convert JSON schema type to Python type hint."""
     if not schema:
@@ -181,21 +365,272 @@ def json_schema_to_python_type(schema: Any) -> str:
 
 def json_to_python_literal(obj):
     """Convert JSON object to Python literal string."""
-    import json
-    import re
-    # Convert to JSON string then replace JSON literals with Python literals
-    json_str = json.dumps(obj, indent=8)
-    json_str = json_str.replace('true', 'True')
-    json_str = json_str.replace('false', 'False')
-    json_str = json_str.replace('null', 'None')
+    # Convert to JSON string then replace JSON literals with Python literals.
+    # Always stdlib json, even when orjson is installed for parsing: orjson writes
+    # non-ASCII text and floats differently, and the output mustn't depend on extras
+    json_str = json.dumps(obj, indent=4)
+
+    # One pass: rewrite true/false/null outside strings, and keep simple arrays
+    # (no nested structures) on single lines for readability
+    return _LITERAL_RE.sub(_rewrite_literal, json_str)
+
+
+def _rewrite_literal(match: re.Match) -> str:
+    string, literal, array_items = match.groups()
+    if string is not None:
+        return string
+    if literal is not None:
+        return _PYTHON_LITERALS[literal]
+    return '[' + _ARRAY_ITEM_RE.sub(_rewrite_array_item, array_items) + ']'
+
+
+def _rewrite_array_item(match: re.Match) -> str:
+    string, literal = match.groups()
+    if string is not None:
+        return string
+    if literal is not None:
+        return _PYTHON_LITERALS[literal]
+    return ' '
+
+
+def enum_to_python_literal(values: List[Any]) -> str:
+    """Convert enum values to a frozenset literal, or a tuple if any value is unhashable."""
+    items = ", ".join(json.dumps(v) if isinstance(v, str) else repr(v) for v in values)
+
+    if all(isinstance(v, (str, int, float, bool, type(None))) for v in values):
+        return f"frozenset({{{items}}})"
+
+    return f"({items},)"
+
+
+def unique_name(name: str, used_names: Set[str]) -> str:
+    """Return name, suffixed with a number if already used, and mark it as used."""
+    unique = name
+    suffix = 2
+    while unique in used_names:
+        unique = f"{name}_{suffix}"
+        suffix += 1
+    used_names.add(unique)
+    return unique
+
+
+def generate_validators(schemas: List[Dict[str, Any]]) -> Tuple[str, Dict[str, str]]:
+    """
+    Generate validator functions specialized for each event schema.
+
+    Enum values are emitted as module-level constants next to the functions.
+    Events with identical checks share one function, and identical enums share
+    one constant. Events with nothing to check get no validator.
+
+    Returns the generated code and a mapping of event name to validator name.
+    """
+    code = ""
+    enum_constants: Dict[str, str] = {}
+    functions: Dict[str, str] = {}
+    validator_names: Dict[str, str] = {}
+    # Different event names can map to the same identifier (e.g. "a-b" and "a_b")
+    function_names: Set[str] = set()
+    constant_names: Set[str] = set()
+
+    for schema in schemas:
+        name = event_name_to_identifier(schema['event_name'])
+        constants = ""
+        checks = []
+
+        # Check required fields
+        for field in schema['required']:
+            checks.append(
+                f'    if {json.dumps(field)} not in properties:\n'
+                f'        errors.append("Missing required field: {field}")\n'
+            )
+
+        # Check enum values
+        for field, prop_schema in schema['properties'].items():
+            if isinstance(prop_schema, dict) and 'enum' in prop_schema:
+                key = json.dumps(field)
+                literal = enum_to_python_literal(prop_schema['enum'])
+
+                enum_const = enum_constants.get(literal)
+                if enum_const is None:
+                    enum_const = enum_constants[literal] = unique_name(
+                        f"_ENUM_{name}_{event_name_to_identifier(field)}", constant_names
+                    )
+                    constants += f"{enum_const} = {literal}\n"
+
+                checks.append(
+                    f'    if {key} in properties:\n'
+                    f'        try:\n'
+                    f'            valid = properties[{key}] in {enum_const}\n'
+                    f'        except TypeError:\n'
+                    f'            # Unhashable values can never match an enum value\n'
+                    f'            valid = False\n'
+                    f'        if not valid:\n'
+                    f'            errors.append(f"Invalid enum value for {field}: {{properties[{field!r}]}}")\n'
+                )
+
+        # Check string formats
+        for field, prop_schema in schema['properties'].items():
+            if isinstance(prop_schema, dict) and prop_schema.get('format') in FORMAT_PATTERNS:
+                key = json.dumps(field)
+                pattern_const = FORMAT_PATTERNS[prop_schema['format']][0]
+                checks.append(
+                    f'    if {key} in properties and isinstance(properties[{key}], str):\n'
+                    f'        if not {pattern_const}.fullmatch(properties[{key}]):\n'
+                    f'            errors.append(f"Invalid {prop_schema["format"]} format for {field}: '
+                    f'{{properties[{field!r}]}}")\n'
+                )
+
+        if not checks:
+            continue
+
+        body = "".join(checks)
+        function_name = functions.get(body)
+
+        if function_name is None:
+            function_name = functions[body] = unique_name(f"_validate_{name}", function_names)
+            code += (
+                constants
+                + ("\n\n" if constants else "")
+                + f"def {function_name}(properties: Dict[str, Any]) -> Optional[List[str]]:\n"
+                + "    errors = []\n\n"
+                + body
+                + "\n    return errors if errors else None\n\n\n"
+            )
+
+        validator_names[schema['event_name']] = function_name
+
+    return code, validator_names
+
+
+def generate_typed_dict(schema: Dict[str, Any]) -> str:
+    """Generate the TypedDict class for an event's properties."""
+    # Add total=False if not all properties are required
+    has_optional = len(schema['properties']) > len(schema['required'])
+    total = ", total=False" if has_optional else ""
+    lines = [f"class {schema['type_name']}(TypedDict{total}):\n"]
+
+    if not schema['properties']:
+        lines.append("    pass\n")
+
+    for prop_name, prop_schema in schema['properties'].items():
+        is_required = prop_name in schema['required']
+        prop_type = json_schema_to_python_type(prop_schema)
+
+        description = prop_schema.get('description', '')
+        if description:
+            lines.append(f'    """{description}"""\n')
+
+        if not is_required:
+            prop_type = f"Optional[{prop_type}]"
+
+        lines.append(f"    {prop_name}: {prop_type}\n")
+
+    lines.append("\n")
+    return "".join(lines)
+
+
+def generate_overload(schema: Dict[str, Any]) -> str:
+    """Generate the capture() overload that types an event's properties."""
+    return f'''
+    @overload
+    def capture(
+        self,
+        distinct_id: str,
+        event: Literal["{schema['event_name']}"],
+        properties: {schema['type_name']},
+        **kwargs
+    ) -> None: ...
+'''
+
+
+def generate_capture_method(schema: Dict[str, Any], validator_name: Optional[str]) -> str:
+    """
+    Generate a capture_<event> method taking the event's properties as keyword arguments.
+
+    Properties named like posthog.capture() options (e.g. timestamp) become arguments
+    with a trailing underscore. Returns an empty string if a property name cannot be
+    used as an argument name.
+    """
+    properties = schema['properties']
+    required = schema['required']
+
+    # Required fields the schema doesn't declare (e.g. from allOf) still need an argument
+    undeclared_required = [field for field in required if field not in properties]
+
+    arg_names = {}
+    for prop_name in [*properties, *undeclared_required]:
+        if (not prop_name.isidentifier() or keyword.iskeyword(prop_name)
+                or prop_name in RESERVED_ARGUMENT_NAMES):
+            return ""
+        arg_names[prop_name] = f"{prop_name}_" if prop_name in CLIENT_CAPTURE_ARGUMENTS else prop_name
+
+    # e.g. both "timestamp" and "timestamp_" declared
+    if len(set(arg_names.values())) < len(arg_names):
+        return ""
+
+    event_name = schema['event_name']
+    name = event_name_to_identifier(event_name)
+
+    # Property names are emitted as string literals, which CPython interns when it
+    # compiles the generated module, so the outgoing dict is built from interned keys
+    params = ""
+    required_items = []
+    optional_props = []
+
+    for prop_name, prop_schema in properties.items():
+        prop_type = json_schema_to_python_type(prop_schema)
+        arg_name = arg_names[prop_name]
+
+        if prop_name in required:
+            params += f"        {arg_name}: {prop_type},\n"
+            required_items.append(f'"{prop_name}": {arg_name}')
+        else:
+            params += f"        {arg_name}: Optional[{prop_type}] = None,\n"
+            optional_props.append(prop_name)
+
+    for prop_name in undeclared_required:
+        arg_name = arg_names[prop_name]
+        params += f"        {arg_name}: Any,\n"
+        required_items.append(f'"{prop_name}": {arg_name}')
+
+    # Properties are keyword-only so optional ones can be omitted in any order
+    if params:
+        params = "        *,\n" + params
+
+    method = f'''
+    def capture_{name}(
+        self,
+        distinct_id: str,
+{params}        **kwargs
+    ) -> None:
+        """Capture a "{event_name}" event."""
+        properties: Dict[str, Any] = {{{", ".join(required_items)}}}
+'''
+
+    for prop_name in optional_props:
+        method += f'''        if {arg_names[prop_name]} is not None:
+            properties["{prop_name}"] = {arg_names[prop_name]}
+'''
+
+    if validator_name:
+        method += f'''
+        # Empty when validation is disabled
+        if self._validators:
+            errors = {validator_name}(properties)
+            if errors:
+                self._handle_validation_errors(distinct_id, "{event_name}", properties, errors)
+'''
 
-    # Keep simple arrays on single lines for readability
-    # This regex collapses arrays that don't contain nested structures
-    json_str = re.sub(r'\[\s+([^\[\{\]]+?)\s+\]',
-                      lambda m: '[' + re.sub(r'\s+', ' ', m.group(1)).strip() + ']',
-                      json_str, flags=re.DOTALL)
+    method += f'''
+        self.posthog.capture(
+            distinct_id=distinct_id,
+            event="{event_name}",
+            properties=properties,
+            **kwargs
+        )
+'''
 
-    return json_str
+    return method
 
 
 def generate_python_code(schemas: List[Dict], class_name: str, validation_mode: str) -> str:
@@ -206,10 +641,12 @@ def generate_python_code(schemas: List[Dict], class_name: str, validation_mode:
 # Generated at: {timestamp}
 # DO NOT EDIT - This file is auto-generated
 
-from typing import Any, Dict, List, Optional, Union, Literal, TypedDict, overload
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Union, Literal, TypedDict, overload
 from enum import Enum
+from types import MappingProxyType
 import posthog
 import json
+import re
 import warnings
 
 
@@ -221,52 +658,111 @@ class ValidationMode(Enum):
 
 """.format(timestamp=datetime.now().isoformat())
 
-    # Generate TypedDict classes for each event
-    typed_dicts = "# ============ Event Types ============\n\n"
-
-    for schema in schemas:
-        typed_dicts += f"class {schema['type_name']}(TypedDict"
-
-        # Add total=False if not all properties are required
-        has_optional = len(schema['properties']) > len(schema['required'])
-        if has_optional:
-            typed_dicts += ", total=False"
+    # Generate specialized validator functions, shared between events where identical
+    validators_code, validator_names = generate_validators(schemas)
 
-        typed_dicts += "):\n"
+    # Render each event's name, TypedDict, capture overload and specialized capture
+    # method in a single pass over the schemas
+    event_names: List[str] = []
+    typed_dict_names: Dict[str, str] = {}
+    typed_dict_parts: List[str] = []
+    overload_parts: List[str] = []
+    method_parts: List[str] = []
+    method_names = set(RESERVED_METHOD_NAMES)
 
-        if not schema['properties']:
-            typed_dicts += "    pass\n\n"
-            continue
+    for schema in schemas:
+        event_names.append(f'"{schema["event_name"]}"')
 
-        for prop_name, prop_schema in schema['properties'].items():
-            is_required = prop_name in schema['required']
-            prop_type = json_schema_to_python_type(prop_schema)
+        # Events whose properties match an earlier event's alias its TypedDict
+        type_name = schema['type_name']
+        typed_dict = generate_typed_dict(schema)
+        body = typed_dict[len(f"class {type_name}"):]
 
-            description = prop_schema.get('description', '')
-            if description:
-                typed_dicts += f'    """{description}"""\n'
+        shared_name = typed_dict_names.setdefault(body, type_name)
+        if shared_name == type_name:
+            typed_dict_parts.append(typed_dict)
+        else:
+            typed_dict_parts.append(f"{type_name} = {shared_name}\n\n")
 
-            if not is_required:
-                prop_type = f"Optional[{prop_type}]"
+        overload_parts.append(generate_overload(schema))
 
-            typed_dicts += f"    {prop_name}: {prop_type}\n"
+        method_name = f"capture_{event_name_to_identifier(schema['event_name'])}"
+        if method_name not in method_names:
+            method = generate_capture_method(schema, validator_names.get(schema['event_name']))
+            if method:
+                method_names.add(method_name)
+                method_parts.append(method)
 
-        typed_dicts += "\n"
+    # Generate TypedDict classes for each event
+    typed_dicts = "# ============ Event Types ============\n\n"
+    typed_dicts += "".join(typed_dict_parts)
 
     # Generate event name type
-    event_names = [f'"{s["event_name"]}"' for s in schemas]
     if event_names:
         typed_dicts += f"EventName = Literal[{', '.join(event_names)}]\n\n"
     else:
         typed_dicts += "EventName = str  # No events defined yet\n\n"
 
     # Generate embedded schemas
-    schemas_const = "# ============ Embedded Schemas ============\n\nSCHEMAS = {\n"
+    # Built on first access (PEP 562): the validators don't need them, so importing the
+    # wrapper doesn't pay for constructing every schema dict. Read-only once built.
+    # A dict literal builds as fast as dict() over a tuple of pairs and compiles faster.
+    schemas_const = """# ============ Embedded Schemas ============
+
+SCHEMAS: Mapping[str, Dict[str, Any]]
+_SCHEMAS: Optional[Mapping[str, Dict[str, Any]]] = None
+
+
+def _build_schemas() -> Mapping[str, Dict[str, Any]]:
+    return MappingProxyType("""
+
+    # All schemas go through a single dump and literal rewrite
+    schemas_literal = json_to_python_literal(
+        {schema["event_name"]: schema["schema"] for schema in schemas}
+    )
+    schemas_const += schemas_literal.replace("\n", "\n    ")
+
+    schemas_const += """)
+
+
+def _get_schemas() -> Mapping[str, Dict[str, Any]]:
+    global _SCHEMAS
+    if _SCHEMAS is None:
+        _SCHEMAS = _build_schemas()
+    return _SCHEMAS
 
-    for schema in schemas:
-        schemas_const += f'    "{schema["event_name"]}": {json_to_python_literal(schema["schema"])[:-1]}    }},\n'
 
-    schemas_const += "}\n\n"
+def __getattr__(name: str) -> Any:
+    if name == "SCHEMAS":
+        return _get_schemas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+"""
+
+    # Emit the validators, with the format patterns they use
+    validators_const = "# ============ Compiled Validators ============\n\n"
+
+    used_formats = {
+        prop_schema.get('format')
+        for schema in schemas
+        for prop_schema in schema['properties'].values()
+        if isinstance(prop_schema, dict)
+    }
+    format_patterns = [
+        f"{const} = re.compile(r'{pattern}')\n"
+        for format_name, (const, pattern) in FORMAT_PATTERNS.items()
+        if format_name in used_formats
+    ]
+    if format_patterns:
+        validators_const += "".join(format_patterns) + "\n\n"
+
+    validators_const += validators_code
+    validators_const += "_VALIDATORS: Dict[str, Callable[[Dict[str, Any]], Optional[List[str]]]] = {\n"
+    validators_const += "".join(
+        f'    "{event_name}": {validator_name},\n' for event_name, validator_name in validator_names.items()
+    )
+    validators_const += "}\n\n\n"
 
     # Generate the wrapper class
     wrapper_class = f'''# ============ Type-Safe Wrapper ============
@@ -276,6 +772,8 @@ class {class_name}:
     Auto-generated PostHog wrapper with embedded schemas and type hints.
     """
 
+    __slots__ = ("posthog", "_validation_mode", "_validators")
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -296,8 +794,23 @@ class {class_name}:
                 self.posthog.project_api_key = api_key
                 self.posthog.host = host
 
-        # Validators are embedded - no runtime loading needed!
-        self.schemas = SCHEMAS
+    @property
+    def validation_mode(self) -> ValidationMode:
+        """The validation mode applied to captured events."""
+        return self._validation_mode
+
+    @validation_mode.setter
+    def validation_mode(self, validation_mode: ValidationMode) -> None:
+        self._validation_mode = validation_mode
+        # Resolve the mode once here so capture() doesn't check it on every call
+        self._validators: Mapping[str, Callable[[Dict[str, Any]], Optional[List[str]]]] = (
+            {{}} if validation_mode == ValidationMode.DISABLED else _VALIDATORS
+        )
+
+    @property
+    def schemas(self) -> Mapping[str, Dict[str, Any]]:
+        """The embedded event schemas."""
+        return _get_schemas()
 
     def set_instance(self, posthog_instance) -> None:
         """Set or update the PostHog instance."""
@@ -305,48 +818,16 @@ class {class_name}:
 
     def _validate(self, event_name: str, properties: Dict[str, Any]) -> Optional[List[str]]:
         """Validate event properties against schema."""
-        if self.validation_mode == ValidationMode.DISABLED:
-            return None
-
-        schema = self.schemas.get(event_name)
-        if not schema:
+        validator = self._validators.get(event_name)
+        if validator is None:
             return None
 
-        errors = []
-
-        # Check required fields
-        for field in schema.get('required', []):
-            if field not in properties:
-                errors.append(f"Missing required field: {{field}}")
-
-        # Basic type validation (extend as needed)
-        for field, value in properties.items():
-            if field in schema.get('properties', {{}}):
-                prop_schema = schema['properties'][field]
-
-                # Check enum values
-                if 'enum' in prop_schema and value not in prop_schema['enum']:
-                    errors.append(f"Invalid enum value for {{field}}: {{value}}")
-
-        return errors if errors else None
-'''
-
-    # Generate overloaded capture methods for type safety
-    capture_methods = ""
-
-    for schema in schemas:
-        capture_methods += f'''
-    @overload
-    def capture(
-        self,
-        distinct_id: str,
-        event: Literal["{schema['event_name']}"],
-        properties: {schema['type_name']},
-        **kwargs
-    ) -> None: ...
+        return validator(properties)
 '''
 
-    capture_methods += f'''
+    # Overloaded capture methods for type safety, then the generic implementation
+    capture_parts = list(overload_parts)
+    capture_parts.append('''
     def capture(
         self,
         distinct_id: str,
@@ -357,29 +838,13 @@ class {class_name}:
         """
         Capture an event with type-safe properties.
         """
-        properties = properties or {{}}
+        properties = properties or {}
 
         # Validate if schema exists
         errors = self._validate(event, properties)
 
         if errors:
-            error_msg = f"Validation failed for event '{{event}}': {{errors}}"
-
-            if self.validation_mode == ValidationMode.STRICT:
-                raise ValueError(error_msg)
-            elif self.validation_mode == ValidationMode.WARNING:
-                warnings.warn(error_msg)
-
-                # Send validation warning event
-                self.posthog.capture(
-                    distinct_id=distinct_id,
-                    event="$schema_validation_warning",
-                    properties={{
-                        "event": event,
-                        "errors": errors,
-                        "properties": properties
-                    }}
-                )
+            self._handle_validation_errors(distinct_id, event, properties, errors)
 
         # Send the event
         self.posthog.capture(
@@ -389,6 +854,69 @@ class {class_name}:
             **kwargs
         )
 
+    def _handle_validation_errors(
+        self,
+        distinct_id: str,
+        event: str,
+        properties: Dict[str, Any],
+        errors: List[str]
+    ) -> None:
+        """Raise or report validation errors according to the validation mode."""
+        error_msg = f"Validation failed for event '{event}': {errors}"
+
+        if self.validation_mode == ValidationMode.STRICT:
+            raise ValueError(error_msg)
+        elif self.validation_mode == ValidationMode.WARNING:
+            warnings.warn(error_msg)
+
+            # Send validation warning event
+            self.posthog.capture(
+                distinct_id=distinct_id,
+                event="$schema_validation_warning",
+                properties={
+                    "event": event,
+                    "errors": errors,
+                    "properties": properties
+                }
+            )
+
+    def capture_many(self, events: Iterable[Dict[str, Any]]) -> None:
+        """
+        Capture several events, validating all of them before any is sent.
+
+        Each event is a dict of capture() arguments: distinct_id, event,
+        properties and any extra keyword arguments.
+        """
+        validators = self._validators
+        batch = []
+
+        for event_kwargs in events:
+            kwargs = dict(event_kwargs)
+            distinct_id = kwargs.pop("distinct_id")
+            event = kwargs.pop("event")
+            properties = kwargs.pop("properties", None) or {}
+
+            validator = validators.get(event)
+            if validator is not None:
+                errors = validator(properties)
+                if errors:
+                    self._handle_validation_errors(distinct_id, event, properties, errors)
+
+            batch.append((distinct_id, event, properties, kwargs))
+
+        for distinct_id, event, properties, kwargs in batch:
+            self.posthog.capture(
+                distinct_id=distinct_id,
+                event=event,
+                properties=properties,
+                **kwargs
+            )
+''')
+
+    # A specialized capture method per event
+    capture_parts.extend(method_parts)
+
+    capture_parts.append(f'''
     def identify(self, distinct_id: str, properties: Optional[Dict[str, Any]] = None, **kwargs) -> None:
         """Identify a user."""
         self.posthog.identify(distinct_id=distinct_id, properties=properties, **kwargs)
@@ -405,6 +933,10 @@ class {class_name}:
         """Get feature flag value."""
         return self.posthog.get_feature_flag(key=key, distinct_id=distinct_id, **kwargs)
 
+    def flush(self) -> None:
+        """Send all queued events without waiting for the next batch upload."""
+        self.posthog.flush()
+
     def shutdown(self) -> None:
         """Shutdown the PostHog client."""
         self.posthog.shutdown()
@@ -412,9 +944,10 @@ class {class_name}:
 
 # Create singleton instance with consistent name to avoid collisions
 hogtyped = {class_name}()
-'''
+''')
+    capture_methods = "".join(capture_parts)
 
-    return imports + typed_dicts + schemas_const + wrapper_class + capture_methods
+    return imports + typed_dicts + schemas_const + validators_const + wrapper_class + capture_methods
 
 
 if __name__ == "__main__":
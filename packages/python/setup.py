@@ -34,9 +34,13 @@ setup(
         "posthog>=2.0.0",
     ],
     extras_require={
+        "fast": [
+            "orjson>=3.0.0",
+        ],
         "dev": [
             "pytest>=7.0.0",
             "pytest-cov>=4.0.0",
+            "pytest-xdist>=3.0.0",
             "black>=22.0.0",
             "mypy>=1.0.0",
             "ruff>=0.1.0",
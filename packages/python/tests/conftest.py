@@ -0,0 +1,10 @@
+"""
+Shared test configuration
+"""
+
+import os
+import sys
+
+# Make the package importable when the tests run from a source checkout without
+# `pip install -e .`; done once here rather than in each test module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
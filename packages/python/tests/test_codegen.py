@@ -2,75 +2,183 @@
 Tests for Python code generation
 """
 
-import os
-import sys
-import tempfile
-import shutil
 from pathlib import Path
+import glob
+import importlib.util
 import json
-import subprocess
-import ast
+import math
+from types import MappingProxyType
+from unittest.mock import Mock
+
+import pytest
+
+from hogtyped.codegen import (
+    generate_wrapper,
+    generate_python_code,
+    load_schemas,
+    event_name_to_type,
+    event_name_to_identifier,
+    enum_to_python_literal,
+    json_schema_to_python_type,
+    json_to_python_literal,
+)
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from hogtyped.codegen import generate_wrapper, load_schemas, event_name_to_type, json_schema_to_python_type
+TEST_SCHEMAS = Path(__file__).parent.parent.parent.parent / "test-schemas" / "*.schema.json"
+
+
+# Snippets expected in the wrapper generated for the test schemas with default options
+EXPECTED_SNIPPETS = [
+    # Python types generated from the JSON schemas
+    pytest.param("class SimpleEventProperties(TypedDict", id="simple-typeddict"),
+    pytest.param("name: str", id="simple-name"),
+    pytest.param("count: int", id="simple-count"),
+    pytest.param("isActive: Optional[bool]", id="simple-is-active"),
+    pytest.param("class ComplexEventProperties(TypedDict", id="complex-typeddict"),
+    pytest.param("id: str", id="complex-id"),
+    pytest.param('status: Literal["pending", "active", "completed", "cancelled"]', id="complex-status"),
+    pytest.param("metadata: Optional[Dict[str, Any]]", id="complex-metadata"),
+    pytest.param("tags: Optional[List[str]]", id="complex-tags"),
+    pytest.param('EventName = Literal["simple_event", "complex_event"]', id="event-name-literal"),
+    # Schemas embedded as a read-only mapping, built on first access
+    pytest.param("def _build_schemas() -> Mapping[str, Dict[str, Any]]:", id="schemas-builder"),
+    pytest.param("return MappingProxyType({", id="schemas-read-only"),
+    pytest.param('if name == "SCHEMAS":', id="schemas-lazy"),
+    pytest.param('"type": "object"', id="schema-type"),
+    pytest.param('"properties":', id="schema-properties"),
+    pytest.param('"required": ["name", "count"]', id="schema-simple-required"),
+    pytest.param('"required": ["id", "status"]', id="schema-complex-required"),
+    # $ref targets resolved into the embedded schemas
+    pytest.param('"name": {', id="ref-name"),
+    pytest.param('"count": {', id="ref-count"),
+    # Typed capture overloads and the generic capture method
+    pytest.param("@overload", id="overload"),
+    pytest.param('event: Literal["simple_event"]', id="overload-simple-event"),
+    pytest.param("properties: SimpleEventProperties", id="overload-simple-properties"),
+    pytest.param('event: Literal["complex_event"]', id="overload-complex-event"),
+    pytest.param("properties: ComplexEventProperties", id="overload-complex-properties"),
+    pytest.param("def capture(", id="capture"),
+    pytest.param("distinct_id: str", id="capture-distinct-id"),
+    pytest.param("event: str", id="capture-event"),
+    pytest.param("properties: Optional[Dict[str, Any]]", id="capture-properties"),
+    # A capture method per event with keyword properties
+    pytest.param("def capture_simple_event(", id="capture-simple-event"),
+    pytest.param("def capture_complex_event(", id="capture-complex-event"),
+    pytest.param("isActive: Optional[bool] = None,", id="capture-simple-event-optional"),
+    pytest.param('properties: Dict[str, Any] = {"name": name, "count": count}', id="capture-simple-event-required"),
+    pytest.param("errors = _validate_simple_event(properties)", id="capture-simple-event-validator"),
+    pytest.param('event="simple_event",', id="capture-simple-event-name"),
+    pytest.param("timestamp_: Optional[str] = None,", id="capture-complex-event-client-option"),
+    # PostHog API compatibility methods
+    pytest.param("def capture_many(self, events: Iterable[Dict[str, Any]])", id="capture-many"),
+    pytest.param("def identify(self", id="identify"),
+    pytest.param("def alias(self", id="alias"),
+    pytest.param("def feature_enabled(self", id="feature-enabled"),
+    pytest.param("def get_feature_flag(self", id="get-feature-flag"),
+    pytest.param("def flush(self", id="flush"),
+    pytest.param("def shutdown(self", id="shutdown"),
+    # Imports
+    pytest.param(
+        "from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Union, Literal, TypedDict, overload",
+        id="import-typing"
+    ),
+    pytest.param("from enum import Enum", id="import-enum"),
+    pytest.param("from types import MappingProxyType", id="import-types"),
+    pytest.param("import posthog", id="import-posthog"),
+    pytest.param("import json", id="import-json"),
+    pytest.param("import re", id="import-re"),
+    pytest.param("import warnings", id="import-warnings"),
+]
+
+
+@pytest.fixture(scope="session")
+def schema_paths():
+    """The test schema files, listed once for the whole session"""
+    return sorted(glob.glob(str(TEST_SCHEMAS)))
+
+
+@pytest.fixture(scope="module")
+def test_output_dir(tmp_path_factory):
+    """Directory for schemas and wrappers written by individual tests"""
+    return tmp_path_factory.mktemp("codegen_out")
+
+
+@pytest.fixture(scope="module")
+def generate(tmp_path_factory, schema_paths):
+    """Generate the wrapper for the test schemas once per set of options"""
+    # Goes through generate_wrapper() rather than the in-memory generate_python_code()
+    # because tests also compile, import and type-check the written file
+    generated = {}
+
+    def generate_once(class_name="PostHog", validation_mode="warning"):
+        key = (class_name, validation_mode)
+        if key not in generated:
+            output_file = tmp_path_factory.mktemp("generated") / f"{class_name}_{validation_mode}.py"
+            generate_wrapper(
+                schemas=schema_paths,
+                output=str(output_file),
+                class_name=class_name,
+                validation_mode=validation_mode
+            )
+            generated[key] = (output_file, output_file.read_text(encoding="utf-8"))
+        return generated[key]
 
+    return generate_once
 
-class TestPythonCodeGenerator:
-    """Test suite for Python code generation"""
 
-    @classmethod
-    def setup_class(cls):
-        """Set up test schemas path"""
-        cls.test_schemas_path = Path(__file__).parent.parent.parent.parent / "test-schemas" / "*.schema.json"
-        cls.test_output_dir = Path(tempfile.mkdtemp())
+@pytest.fixture(scope="module")
+def default_generated(generate):
+    """The wrapper generated for the test schemas with default options"""
+    return generate()
 
-    @classmethod
-    def teardown_class(cls):
-        """Clean up test output"""
-        if cls.test_output_dir.exists():
-            shutil.rmtree(cls.test_output_dir)
 
-    def test_basic_generation(self):
-        """Test that basic code generation works"""
-        output_file = self.test_output_dir / "test_generated.py"
+# A single event with an enum, for runtime tests of validation
+PLAN_EVENTS = {
+    "plan_selected": {
+        "type": "object",
+        "properties": {"plan": {"type": "string", "enum": ["free", "pro"]}},
+        "required": ["plan"]
+    }
+}
 
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            class_name="TestPostHog",
-            validation_mode="strict"
-        )
 
-        assert output_file.exists()
+def exec_wrapper(schema_dir, events, validation_mode="strict"):
+    """Generate a wrapper for the given event schemas and return its module namespace"""
+    schema_dir.mkdir(exist_ok=True)
+    with open(schema_dir / "events.schema.json", "w") as f:
+        json.dump({"events": events}, f)
 
-        generated_code = output_file.read_text()
+    code = generate_python_code(load_schemas(str(schema_dir / "*.schema.json")), "PostHog", validation_mode)
+    namespace = {"__name__": "generated_wrapper"}
+    exec(compile(code, str(schema_dir / "generated_wrapper.py"), "exec"), namespace)
+    return namespace
+
+
+class TestPythonCodeGenerator:
+    """Test suite for Python code generation"""
+
+    def test_basic_generation(self, generate):
+        """Test that basic code generation works"""
+        output_file, generated_code = generate(class_name="TestPostHog", validation_mode="strict")
+
+        assert output_file.exists()
 
         # Check for generated components
         assert "class TestPostHog:" in generated_code
         assert "class SimpleEventProperties(TypedDict" in generated_code
         assert "class ComplexEventProperties(TypedDict" in generated_code
         assert "EventName = Literal[" in generated_code
-        assert "SCHEMAS = {" in generated_code
+        assert "def _build_schemas() -> Mapping[str, Dict[str, Any]]:" in generated_code
         assert '"simple_event":' in generated_code
         assert '"complex_event":' in generated_code
 
-    def test_generated_python_is_valid(self):
+    def test_generated_python_is_valid(self, generate):
         """Test that generated Python code is syntactically valid"""
-        output_file = self.test_output_dir / "test_valid.py"
-
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            class_name="TestPostHog"
-        )
+        output_file, generated_code = generate(class_name="TestPostHog")
 
-        generated_code = output_file.read_text()
-
-        # Try to parse the generated Python code
+        # Try to compile the generated Python code
         try:
-            ast.parse(generated_code)
+            code = compile(generated_code, str(output_file), 'exec')
         except SyntaxError as e:
             assert False, f"Generated Python code has syntax error: {e}"
 
@@ -82,225 +190,495 @@ class TestPythonCodeGenerator:
         }
 
         try:
-            exec(compile(generated_code, str(output_file), 'exec'), spec)
+            exec(code, spec)
         except ImportError:
             # Import errors for posthog are expected in test environment
-            pass
+            return
         except Exception as e:
             assert False, f"Generated Python code has runtime error: {e}"
 
-    def test_type_generation(self):
-        """Test correct Python type generation from JSON schema"""
-        output_file = self.test_output_dir / "test_types.py"
+        # Check the module-level names that were actually defined
+        assert isinstance(spec["hogtyped"], spec["TestPostHog"])
+        assert set(spec["_VALIDATORS"]) == {"simple_event", "complex_event"}
 
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
-        )
+    @pytest.mark.parametrize("snippet", EXPECTED_SNIPPETS)
+    def test_generated_code_contains(self, default_generated, snippet):
+        """Test that the default wrapper contains each expected snippet"""
+        _, generated_code = default_generated
 
-        generated_code = output_file.read_text()
+        assert snippet in generated_code
 
-        # Check SimpleEvent TypedDict
-        assert "class SimpleEventProperties(TypedDict" in generated_code
-        assert "name: str" in generated_code
-        assert "count: int" in generated_code
-        assert "isActive: Optional[bool]" in generated_code
-
-        # Check ComplexEvent TypedDict
-        assert "class ComplexEventProperties(TypedDict" in generated_code
-        assert "id: str" in generated_code
-        assert 'status: Literal["pending", "active", "completed", "cancelled"]' in generated_code
-        assert "metadata: Optional[Dict[str, Any]]" in generated_code
-        assert "tags: Optional[List[str]]" in generated_code
+    def test_ref_resolution(self, default_generated):
+        """Test that $ref references are resolved in embedded schemas"""
+        _, generated_code = default_generated
 
-    def test_event_name_literal_type(self):
-        """Test that EventName literal type includes all events"""
-        output_file = self.test_output_dir / "test_events.py"
+        # Should not contain unresolved $ref
+        assert '"$ref"' not in generated_code
 
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
+    def test_external_ref_resolution(self, test_output_dir):
+        """Test that external $ref files are resolved and parsed once"""
+        from hogtyped.codegen import _load_ref_file
+
+        schema_dir = test_output_dir / "external-ref-schemas"
+        (schema_dir / "events").mkdir(parents=True, exist_ok=True)
+
+        with open(schema_dir / "common.json", "w") as f:
+            json.dump({
+                "definitions": {
+                    "Page": {
+                        "type": "object",
+                        "properties": {"url": {"type": "string"}},
+                        "required": ["url"]
+                    }
+                }
+            }, f)
+
+        with open(schema_dir / "events" / "pages.schema.json", "w") as f:
+            json.dump({
+                "events": {
+                    "page_viewed": {"$ref": "./../common.json#/definitions/Page"},
+                    "page_left": {"$ref": "./../common.json#/definitions/Page"}
+                }
+            }, f)
+
+        schemas = load_schemas(str(schema_dir / "events" / "*.schema.json"))
+
+        assert [s["required"] for s in schemas] == [["url"], ["url"]]
+        assert _load_ref_file.cache_info().misses == 1
+
+    def test_all_of_merge(self, test_output_dir):
+        """Test that allOf schemas merge properties and keep required fields in order"""
+        schema_dir = test_output_dir / "all-of-schemas"
+        schema_dir.mkdir(exist_ok=True)
+
+        with open(schema_dir / "merged.schema.json", "w") as f:
+            json.dump({
+                "events": {
+                    "order_placed": {
+                        "allOf": [
+                            {"properties": {"orderId": {"type": "string"}}, "required": ["orderId", "total"]},
+                            {"properties": {"total": {"type": "number"}}, "required": ["total", "currency"]}
+                        ]
+                    }
+                }
+            }, f)
+
+        schemas = load_schemas(str(schema_dir / "*.schema.json"))
+
+        assert list(schemas[0]["properties"]) == ["orderId", "total"]
+        assert schemas[0]["required"] == ["orderId", "total", "currency"]
+
+    def test_loads_json_accepted_by_stdlib(self, tmp_path):
+        """Test that schemas load the same whether or not orjson is installed"""
+        # orjson on its own rejects NaN and integers beyond 64 bits
+        (tmp_path / "numbers.schema.json").write_text(
+            '{"events": {"order_placed": {"type": "object", "properties": {'
+            '"total": {"type": "integer", "maximum": 100000000000000000000000}, '
+            '"ratio": {"type": "number", "default": NaN}}}}}'
         )
 
-        generated_code = output_file.read_text()
+        schemas = load_schemas(str(tmp_path / "*.schema.json"))
 
-        assert 'EventName = Literal["simple_event", "complex_event"]' in generated_code
+        properties = schemas[0]["properties"]
+        assert properties["total"]["maximum"] == 10 ** 23
+        assert math.isnan(properties["ratio"]["default"])
 
-    def test_schema_embedding(self):
-        """Test that full JSON schemas are embedded in generated code"""
-        output_file = self.test_output_dir / "test_schemas.py"
+    def test_symlinked_schema_loaded_once(self, test_output_dir):
+        """Test that a schema file reachable through a symlink is only loaded once"""
+        schema_dir = test_output_dir / "symlinked-schemas"
+        schema_dir.mkdir(exist_ok=True)
 
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
-        )
+        with open(schema_dir / "events.schema.json", "w") as f:
+            json.dump({"events": {"page_viewed": {"type": "object", "properties": {}}}}, f)
+        link = schema_dir / "linked.schema.json"
+        if not link.exists():
+            link.symlink_to(schema_dir / "events.schema.json")
 
-        generated_code = output_file.read_text()
+        schemas = load_schemas(str(schema_dir / "*.schema.json"))
 
-        # Check that schemas are embedded as dictionary
-        assert "SCHEMAS = {" in generated_code
+        assert [s["event_name"] for s in schemas] == ["page_viewed"]
 
-        # Check that schema structure is preserved
-        assert '"type": "object"' in generated_code
-        assert '"properties":' in generated_code
-        assert '"required": ["name", "count"]' in generated_code
-        assert '"required": ["id", "status"]' in generated_code
+    def test_load_schemas_from_paths(self, schema_paths):
+        """Test that a list of schema files loads the same as the matching glob"""
+        assert load_schemas(schema_paths) == load_schemas(str(TEST_SCHEMAS))
 
-    def test_ref_resolution(self):
-        """Test that $ref references are resolved in embedded schemas"""
-        output_file = self.test_output_dir / "test_refs.py"
-
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
-        )
-
-        generated_code = output_file.read_text()
-
-        # Should not contain unresolved $ref
-        assert '"$ref"' not in generated_code
-
-        # Should have resolved the properties
-        assert '"name": {' in generated_code
-        assert '"count": {' in generated_code
-
-    def test_validation_code(self):
+    def test_validation_code(self, generate):
         """Test that validation functions are generated"""
-        output_file = self.test_output_dir / "test_validation.py"
-
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            validation_mode="strict"
-        )
-
-        generated_code = output_file.read_text()
+        output_file, generated_code = generate(validation_mode="strict")
 
         # Check for validation method
         assert "def _validate(self" in generated_code
+        assert "validator = self._validators.get(event_name)" in generated_code
+
+        # Check for per-event validators generated from the schemas
+        assert "def _validate_simple_event(properties: Dict[str, Any])" in generated_code
+        assert "def _validate_complex_event(properties: Dict[str, Any])" in generated_code
+        assert '"simple_event": _validate_simple_event,' in generated_code
         assert "errors = []" in generated_code
-        assert "for field in schema.get('required', []):" in generated_code
-        assert "if field not in properties:" in generated_code
+        assert 'if "name" not in properties:' in generated_code
+        assert '_ENUM_complex_event_status = frozenset({"pending", "active", "completed", "cancelled"})' in generated_code
+        assert 'valid = properties["status"] in _ENUM_complex_event_status' in generated_code
 
         # Check for validation in capture method
         assert "errors = self._validate(event, properties)" in generated_code
+
+        # Run the generated validators
+        namespace = {"__name__": "test_validators"}
+        exec(compile(generated_code, str(output_file), "exec"), namespace)
+        validators = namespace["_VALIDATORS"]
+
+        assert validators["complex_event"]({"id": "1", "status": "active"}) is None
+        assert validators["complex_event"]({"id": "1", "status": "unknown"}) == [
+            "Invalid enum value for status: unknown"
+        ]
+        assert validators["complex_event"]({"status": ["active"]}) == [
+            "Missing required field: id",
+            "Invalid enum value for status: ['active']"
+        ]
         assert "if errors:" in generated_code
 
-    def test_validation_modes(self):
-        """Test different validation modes"""
-        # Test strict mode
-        output_file = self.test_output_dir / "test_strict.py"
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            validation_mode="strict"
+    def test_capture_methods(self, test_output_dir):
+        """Test that generated capture_<event> methods validate and send events"""
+        namespace = exec_wrapper(test_output_dir / "capture-schemas", {
+            "order_placed": {
+                "allOf": [
+                    {"properties": {"orderId": {"type": "string"}}, "required": ["orderId", "total"]},
+                    {"properties": {"total": {"type": "number"}}, "required": ["total", "currency"]}
+                ]
+            },
+            "plan_selected": {
+                "type": "object",
+                "properties": {
+                    "plan": {"type": "string", "enum": ["free", "pro"]},
+                    "seats": {"type": "integer"}
+                },
+                "required": ["plan"]
+            },
+            "page_viewed": {
+                "type": "object",
+                "properties": {"timestamp": {"type": "string"}}
+            }
+        })
+        client = Mock()
+        analytics = namespace["PostHog"](posthog_instance=client)
+
+        # Required fields that aren't declared as properties are still arguments
+        analytics.capture_order_placed("user-1", orderId="1", total=2.0, currency="USD")
+        client.capture.assert_called_once_with(
+            distinct_id="user-1",
+            event="order_placed",
+            properties={"orderId": "1", "total": 2.0, "currency": "USD"}
         )
 
-        generated_code = output_file.read_text()
-        assert "ValidationMode.STRICT" in generated_code
-        assert "raise ValueError" in generated_code
-
-        # Test warning mode
-        output_file = self.test_output_dir / "test_warning.py"
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            validation_mode="warning"
+        # Omitted optional properties are left out
+        client.reset_mock()
+        analytics.capture_plan_selected("user-1", plan="pro", timestamp=None)
+        client.capture.assert_called_once_with(
+            distinct_id="user-1",
+            event="plan_selected",
+            properties={"plan": "pro"},
+            timestamp=None
         )
 
-        generated_code = output_file.read_text()
-        assert "ValidationMode.WARNING" in generated_code
-        assert "warnings.warn" in generated_code
-
-        # Test disabled mode
-        output_file = self.test_output_dir / "test_disabled.py"
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            validation_mode="disabled"
+        # A property named like a posthog.capture() option takes a trailing underscore,
+        # and the option itself is still forwarded to the client
+        client.reset_mock()
+        analytics.capture_page_viewed("user-1", timestamp_="2024-01-01", timestamp="2024-01-02T00:00:00Z")
+        client.capture.assert_called_once_with(
+            distinct_id="user-1",
+            event="page_viewed",
+            properties={"timestamp": "2024-01-01"},
+            timestamp="2024-01-02T00:00:00Z"
         )
 
-        generated_code = output_file.read_text()
-        assert "ValidationMode.DISABLED" in generated_code
-
-    def test_class_generation(self):
-        """Test class generation with custom name"""
-        output_file = self.test_output_dir / "test_class.py"
+        client.reset_mock()
+        with pytest.raises(ValueError, match="Invalid enum value for plan: team"):
+            analytics.capture_plan_selected("user-1", plan="team", seats=3)
+        client.capture.assert_not_called()
+
+    def test_format_validation(self, test_output_dir, schema_paths):
+        """Test that email and uri formats get precompiled pattern checks"""
+        schema_dir = test_output_dir / "format-schemas"
+        schema_dir.mkdir(exist_ok=True)
+
+        with open(schema_dir / "formats.schema.json", "w") as f:
+            json.dump({
+                "events": {
+                    "user_signed_up": {
+                        "type": "object",
+                        "properties": {
+                            "email": {"type": "string", "format": "email"},
+                            "website": {"type": "string", "format": "uri"}
+                        }
+                    }
+                }
+            }, f)
+
+        output_file = test_output_dir / "test_formats.py"
 
         generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file),
-            class_name="CustomAnalytics"
+            schemas=str(schema_dir / "*.json"),
+            output=str(output_file)
         )
 
         generated_code = output_file.read_text()
 
-        assert "class CustomAnalytics:" in generated_code
-        assert "hogtyped = CustomAnalytics()" in generated_code
+        assert "_EMAIL_RE = re.compile(" in generated_code
+        assert "_URI_RE = re.compile(" in generated_code
+        assert 'if not _EMAIL_RE.fullmatch(properties["email"]):' in generated_code
+        assert 'if not _URI_RE.fullmatch(properties["website"]):' in generated_code
 
-    def test_capture_method_overloads(self):
-        """Test that capture method has type overloads"""
-        output_file = self.test_output_dir / "test_capture.py"
+        # Formats that aren't used don't get a pattern
+        output_file = test_output_dir / "test_no_formats.py"
 
         generate_wrapper(
-            schemas=str(self.test_schemas_path),
+            schemas=schema_paths,
             output=str(output_file)
         )
 
-        generated_code = output_file.read_text()
-
-        # Check for typed capture overloads
-        assert "@overload" in generated_code
-        assert 'event: Literal["simple_event"]' in generated_code
-        assert "properties: SimpleEventProperties" in generated_code
-        assert 'event: Literal["complex_event"]' in generated_code
-        assert "properties: ComplexEventProperties" in generated_code
-
-        # Check for main capture method
-        assert "def capture(" in generated_code
-        assert "distinct_id: str" in generated_code
-        assert "event: str" in generated_code
-        assert "properties: Optional[Dict[str, Any]]" in generated_code
-
-    def test_posthog_api_methods(self):
-        """Test that PostHog API compatibility methods are included"""
-        output_file = self.test_output_dir / "test_api.py"
+        assert "_EMAIL_RE" not in output_file.read_text()
+
+    @pytest.mark.parametrize("email,valid", [
+        ("user@example.com", True),
+        ("first.last@mail.example.co.uk", True),
+        ("user@localhost", False),
+        ("user@example.", False),
+        ("user@example..com", False),
+        ("@example.com", False),
+        ("user@exa mple.com", False),
+        # Long dotted domains fail in linear time
+        ("user@" + "a." * 20000 + "a ", False),
+    ])
+    def test_email_format_validation(self, test_output_dir, email, valid):
+        """Test the generated email format check"""
+        namespace = exec_wrapper(test_output_dir / "email-schemas", {
+            "user_signed_up": {
+                "type": "object",
+                "properties": {"email": {"type": "string", "format": "email"}}
+            }
+        })
+
+        errors = namespace["_validate_user_signed_up"]({"email": email})
+
+        if valid:
+            assert errors is None
+        else:
+            assert errors == [f"Invalid email format for email: {email}"]
+
+    def test_shared_validators(self, test_output_dir):
+        """Test that events with identical checks share validators, enum constants and types"""
+        schema_dir = test_output_dir / "shared-schemas"
+        schema_dir.mkdir(exist_ok=True)
+
+        plan = {"type": "string", "enum": ["free", "pro"]}
+        with open(schema_dir / "shared.schema.json", "w") as f:
+            json.dump({
+                "events": {
+                    "plan_selected": {
+                        "type": "object",
+                        "properties": {"plan": plan},
+                        "required": ["plan"]
+                    },
+                    "plan_changed": {
+                        "type": "object",
+                        "properties": {"plan": plan},
+                        "required": ["plan"]
+                    },
+                    "plan_cancelled": {
+                        "type": "object",
+                        "properties": {"plan": plan}
+                    }
+                }
+            }, f)
+
+        output_file = test_output_dir / "test_shared.py"
 
         generate_wrapper(
-            schemas=str(self.test_schemas_path),
+            schemas=str(schema_dir / "*.json"),
             output=str(output_file)
         )
 
         generated_code = output_file.read_text()
 
-        # Check for PostHog methods
-        assert "def identify(self" in generated_code
-        assert "def alias(self" in generated_code
-        assert "def feature_enabled(self" in generated_code
-        assert "def get_feature_flag(self" in generated_code
-        assert "def shutdown(self" in generated_code
+        assert generated_code.count("frozenset({") == 1
+        assert generated_code.count("def _validate_") == 2
+        assert '"plan_selected": _validate_plan_selected,' in generated_code
+        assert '"plan_changed": _validate_plan_selected,' in generated_code
+        assert '"plan_cancelled": _validate_plan_cancelled,' in generated_code
+        assert "PlanChangedProperties = PlanSelectedProperties" in generated_code
+        assert "class PlanCancelledProperties(TypedDict, total=False):" in generated_code
+
+    def test_colliding_identifiers(self, test_output_dir):
+        """Test that event names mapping to the same identifier keep separate validators"""
+        namespace = exec_wrapper(test_output_dir / "colliding-schemas", {
+            "a-b": {"type": "object", "properties": {}, "required": ["x"]},
+            "a_b": {"type": "object", "properties": {}, "required": ["y"]}
+        })
+        validators = namespace["_VALIDATORS"]
+
+        assert validators["a-b"] is not validators["a_b"]
+        assert validators["a-b"]({"x": 1}) is None
+        assert validators["a_b"]({"y": 1}) is None
+
+        # Same for enum constants with different values
+        namespace = exec_wrapper(test_output_dir / "colliding-enum-schemas", {
+            "a-b": {"type": "object", "properties": {"x": {"type": "string", "enum": ["one"]}}},
+            "a_b": {"type": "object", "properties": {"x": {"type": "string", "enum": ["two"]}}}
+        })
+        validators = namespace["_VALIDATORS"]
+
+        assert validators["a-b"]({"x": "one"}) is None
+        assert validators["a_b"]({"x": "two"}) is None
+        assert validators["a_b"]({"x": "one"}) == ["Invalid enum value for x: one"]
+
+    def test_capture_many_not_replaced_by_event_method(self, test_output_dir):
+        """Test that an event named "many" doesn't replace the capture_many() batch method"""
+        namespace = exec_wrapper(test_output_dir / "many-schemas", {
+            "many": {"type": "object", "properties": {"n": {"type": "integer"}}, "required": ["n"]}
+        })
+        client = Mock()
+        analytics = namespace["PostHog"](posthog_instance=client)
+
+        analytics.capture_many([{"distinct_id": "user-1", "event": "many", "properties": {"n": 1}}])
+
+        client.capture.assert_called_once_with(distinct_id="user-1", event="many", properties={"n": 1})
+
+    def test_capture_many_strict_rejects_whole_batch(self, tmp_path):
+        """Test that in strict mode one invalid event keeps the whole batch from being sent"""
+        namespace = exec_wrapper(tmp_path / "schemas", PLAN_EVENTS, validation_mode="strict")
+        client = Mock()
+        analytics = namespace["PostHog"](posthog_instance=client)
+
+        with pytest.raises(ValueError, match="Invalid enum value for plan: team"):
+            analytics.capture_many([
+                {"distinct_id": "user-1", "event": "plan_selected", "properties": {"plan": "free"}},
+                {"distinct_id": "user-2", "event": "plan_selected", "properties": {"plan": "team"}},
+                {"distinct_id": "user-3", "event": "plan_selected", "properties": {"plan": "pro"}},
+            ])
+
+        client.capture.assert_not_called()
+
+    def test_capture_many_warning_sends_every_event(self, tmp_path):
+        """Test that in warning mode invalid events are reported and every event is still sent in order"""
+        namespace = exec_wrapper(tmp_path / "schemas", PLAN_EVENTS, validation_mode="warning")
+        client = Mock()
+        analytics = namespace["PostHog"](posthog_instance=client)
+
+        with pytest.warns(UserWarning, match="Invalid enum value for plan: team"):
+            analytics.capture_many([
+                {"distinct_id": "user-1", "event": "plan_selected", "properties": {"plan": "free"}},
+                {"distinct_id": "user-2", "event": "plan_selected", "properties": {"plan": "team"}},
+                {"distinct_id": "user-3", "event": "plan_selected", "properties": {"plan": "pro"}, "uuid": "u-3"},
+            ])
+
+        sent = [call.kwargs for call in client.capture.call_args_list if call.kwargs["event"] == "plan_selected"]
+        assert sent == [
+            {"distinct_id": "user-1", "event": "plan_selected", "properties": {"plan": "free"}},
+            {"distinct_id": "user-2", "event": "plan_selected", "properties": {"plan": "team"}},
+            {"distinct_id": "user-3", "event": "plan_selected", "properties": {"plan": "pro"}, "uuid": "u-3"},
+        ]
+        client.capture.assert_any_call(
+            distinct_id="user-2",
+            event="$schema_validation_warning",
+            properties={
+                "event": "plan_selected",
+                "errors": ["Invalid enum value for plan: team"],
+                "properties": {"plan": "team"}
+            }
+        )
+
+    @pytest.mark.parametrize("validation_mode,snippets", [
+        ("strict", ["ValidationMode.STRICT", "raise ValueError"]),
+        ("warning", ["ValidationMode.WARNING", "warnings.warn"]),
+        ("disabled", ["ValidationMode.DISABLED"]),
+    ])
+    def test_validation_modes(self, generate, validation_mode, snippets):
+        """Test different validation modes"""
+        _, generated_code = generate(validation_mode=validation_mode)
+
+        for snippet in snippets:
+            assert snippet in generated_code
+
+    def test_validation_mode_switching(self, tmp_path):
+        """Test that disabled mode skips validators and that the mode can be changed later"""
+        namespace = exec_wrapper(tmp_path / "schemas", PLAN_EVENTS, validation_mode="disabled")
+        ValidationMode = namespace["ValidationMode"]
+
+        # Spy on the validator however it is reached: via _VALIDATORS or by name
+        validator = Mock(wraps=namespace["_validate_plan_selected"])
+        namespace["_VALIDATORS"]["plan_selected"] = validator
+        namespace["_validate_plan_selected"] = validator
+
+        client = Mock()
+        analytics = namespace["PostHog"](posthog_instance=client)
+        invalid = {"plan": "team"}
+
+        analytics.capture("user-1", "plan_selected", invalid)
+        analytics.capture_plan_selected("user-1", plan="team")
+        analytics.capture_many([{"distinct_id": "user-1", "event": "plan_selected", "properties": invalid}])
+
+        validator.assert_not_called()
+        assert client.capture.call_count == 3
+
+        analytics.validation_mode = ValidationMode.STRICT
+        with pytest.raises(ValueError, match="Invalid enum value for plan: team"):
+            analytics.capture("user-1", "plan_selected", invalid)
+        with pytest.raises(ValueError, match="Invalid enum value for plan: team"):
+            analytics.capture_plan_selected("user-1", plan="team")
+        assert validator.call_count == 2
+        assert client.capture.call_count == 3
+
+        analytics.validation_mode = ValidationMode.DISABLED
+        validator.reset_mock()
+        analytics.capture("user-1", "plan_selected", invalid)
+        analytics.capture_plan_selected("user-1", plan="team")
+
+        validator.assert_not_called()
+        assert client.capture.call_count == 5
+
+    def test_schemas_read_only_and_lazy(self, default_generated):
+        """Test that SCHEMAS is built on first access as a read-only mapping"""
+        output_file, _ = default_generated
+        spec = importlib.util.spec_from_file_location("generated_schemas", output_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        assert module._SCHEMAS is None
+
+        schemas = module.SCHEMAS
+        assert isinstance(schemas, MappingProxyType)
+        assert set(schemas) == {"simple_event", "complex_event"}
+        assert module.SCHEMAS is schemas
+        assert module.hogtyped.schemas is module.SCHEMAS
+
+        with pytest.raises(TypeError):
+            schemas["simple_event"] = {}
+
+    def test_class_generation(self, generate):
+        """Test class generation with custom name"""
+        _, generated_code = generate(class_name="CustomAnalytics")
 
-    def test_imports(self):
-        """Test that all necessary imports are included"""
-        output_file = self.test_output_dir / "test_imports.py"
+        assert "class CustomAnalytics:" in generated_code
+        assert "hogtyped = CustomAnalytics()" in generated_code
 
-        generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
-        )
+    def test_instance_attributes_fixed_by_slots(self, tmp_path):
+        """Test that wrapper instances use __slots__ and reject unknown attributes"""
+        namespace = exec_wrapper(tmp_path / "schemas", PLAN_EVENTS)
+        analytics = namespace["PostHog"](posthog_instance=Mock())
 
-        generated_code = output_file.read_text()
+        assert not hasattr(analytics, "__dict__")
+        with pytest.raises(AttributeError):
+            analytics.project_api_key = "phc_123"
 
-        assert "from typing import Any, Dict, List, Optional, Union, Literal, TypedDict, overload" in generated_code
-        assert "from enum import Enum" in generated_code
-        assert "import posthog" in generated_code
-        assert "import json" in generated_code
-        assert "import warnings" in generated_code
+        # Slot attributes can still be replaced
+        client = Mock()
+        analytics.set_instance(client)
+        assert analytics.posthog is client
 
-    def test_error_handling(self):
+    def test_error_handling(self, tmp_path):
         """Test handling of missing or invalid schemas"""
         # Test with non-existent schema files
-        output_file = self.test_output_dir / "test_missing.py"
+        output_file = tmp_path / "test_missing.py"
 
         generate_wrapper(
             schemas="./non-existent/*.json",
@@ -312,10 +690,10 @@ class TestPythonCodeGenerator:
         assert "class PostHog:" in generated_code
 
         # Test with empty schema directory
-        empty_dir = self.test_output_dir / "empty"
-        empty_dir.mkdir(exist_ok=True)
+        empty_dir = tmp_path / "empty"
+        empty_dir.mkdir()
 
-        output_file = self.test_output_dir / "test_empty.py"
+        output_file = tmp_path / "test_empty.py"
         generate_wrapper(
             schemas=str(empty_dir / "*.json"),
             output=str(output_file)
@@ -323,46 +701,139 @@ class TestPythonCodeGenerator:
 
         assert output_file.exists()
 
-    def test_helper_functions(self):
-        """Test helper functions"""
-        # Test event_name_to_type
-        assert event_name_to_type("simple_event") == "SimpleEventProperties"
-        assert event_name_to_type("user_signed_up") == "UserSignedUpProperties"
-        assert event_name_to_type("button-clicked") == "ButtonClickedProperties"
-
-        # Test json_schema_to_python_type
-        assert json_schema_to_python_type({"type": "string"}) == "str"
-        assert json_schema_to_python_type({"type": "integer"}) == "int"
-        assert json_schema_to_python_type({"type": "number"}) == "float"
-        assert json_schema_to_python_type({"type": "boolean"}) == "bool"
-        assert json_schema_to_python_type({
-            "type": "string",
-            "enum": ["a", "b", "c"]
-        }) == 'Literal["a", "b", "c"]'
-        assert json_schema_to_python_type({
-            "type": "array",
-            "items": {"type": "string"}
-        }) == "List[str]"
-        assert json_schema_to_python_type({
-            "type": "object"
-        }) == "Dict[str, Any]"
-
-    def test_mypy_compatibility(self):
-        """Test that generated code passes mypy type checking"""
-        output_file = self.test_output_dir / "test_mypy.py"
+    def test_skips_up_to_date_output(self, test_output_dir, schema_paths):
+        """Test that unchanged inputs don't regenerate the wrapper"""
+        output_file = test_output_dir / "test_cached.py"
+
+        generate_wrapper(schemas=schema_paths, output=str(output_file))
+        first_code = output_file.read_text()
+        assert first_code.startswith("# hogtyped-hash: ")
+
+        # Same inputs: the file (including its timestamp) is left alone
+        generate_wrapper(schemas=schema_paths, output=str(output_file))
+        assert output_file.read_text() == first_code
+
+        # Forced or changed options regenerate it
+        generate_wrapper(schemas=schema_paths, output=str(output_file), force=True)
+        forced_code = output_file.read_text()
+        assert forced_code.splitlines()[0] == first_code.splitlines()[0]
+        assert forced_code.splitlines()[2].startswith("# Generated at: ")
+        assert forced_code.splitlines()[2] != first_code.splitlines()[2]
 
         generate_wrapper(
-            schemas=str(self.test_schemas_path),
-            output=str(output_file)
+            schemas=schema_paths,
+            output=str(output_file),
+            validation_mode="strict"
         )
+        assert output_file.read_text().splitlines()[0] != first_code.splitlines()[0]
+
+    def test_write_failure_leaves_no_temporary_file(self, tmp_path, schema_paths, monkeypatch):
+        """Test that a failed write removes its temporary file and keeps the old output"""
+        output_file = tmp_path / "test_atomic.py"
+        output_file.write_text("# previous wrapper\n")
+
+        def fail_replace(src, dst):
+            raise OSError("disk full")
+
+        monkeypatch.setattr("hogtyped.codegen.os.replace", fail_replace)
+        with pytest.raises(OSError, match="disk full"):
+            generate_wrapper(schemas=schema_paths, output=str(output_file))
+
+        assert [path.name for path in tmp_path.iterdir()] == ["test_atomic.py"]
+        assert output_file.read_text() == "# previous wrapper\n"
+
+        monkeypatch.undo()
+        generate_wrapper(schemas=schema_paths, output=str(output_file))
+
+        assert [path.name for path in tmp_path.iterdir()] == ["test_atomic.py"]
+        assert output_file.read_text().startswith("# hogtyped-hash: ")
+
+    def test_regenerates_on_property_reorder(self, tmp_path):
+        """Test that reordering properties regenerates the wrapper"""
+        schema_file = tmp_path / "events.schema.json"
+        output_file = tmp_path / "test_reordered.py"
+
+        for properties in (["first", "second"], ["second", "first"]):
+            schema_file.write_text(json.dumps({"events": {"page_viewed": {
+                "type": "object",
+                "properties": {name: {"type": "string"} for name in properties}
+            }}}))
+            generate_wrapper(schemas=str(schema_file), output=str(output_file))
+
+        generated_code = output_file.read_text()
+        assert generated_code.index("second: Optional[str]") < generated_code.index("first: Optional[str]")
+
+    def test_regenerates_non_utf8_output(self, tmp_path, schema_paths):
+        """Test that an existing output that isn't valid UTF-8 is overwritten"""
+        output_file = tmp_path / "test_legacy.py"
+        output_file.write_bytes(b"# Auto-generated PostHog wrapper\n# caf\xe9\n")
+
+        generate_wrapper(schemas=schema_paths, output=str(output_file))
+
+        assert output_file.read_text(encoding="utf-8").startswith("# hogtyped-hash: ")
+
+    @pytest.mark.parametrize("event_name,expected", [
+        ("simple_event", "SimpleEventProperties"),
+        ("user_signed_up", "UserSignedUpProperties"),
+        ("button-clicked", "ButtonClickedProperties"),
+    ])
+    def test_event_name_to_type(self, event_name, expected):
+        """Test conversion of event names to TypedDict names"""
+        assert event_name_to_type(event_name) == expected
+
+    @pytest.mark.parametrize("event_name,expected", [
+        ("simple_event", "simple_event"),
+        ("button-clicked", "button_clicked"),
+        ("$pageview", "_pageview"),
+    ])
+    def test_event_name_to_identifier(self, event_name, expected):
+        """Test conversion of event names to identifier fragments"""
+        assert event_name_to_identifier(event_name) == expected
+
+    @pytest.mark.parametrize("values,expected", [
+        (["a", "b"], 'frozenset({"a", "b"})'),
+        ([1, None, True], "frozenset({1, None, True})"),
+        (["a", [1, 2]], '("a", [1, 2],)'),
+    ])
+    def test_enum_to_python_literal(self, values, expected):
+        """Test enum values become a frozenset, or a tuple if any is unhashable"""
+        assert enum_to_python_literal(values) == expected
+
+    @pytest.mark.parametrize("obj,expected", [
+        ({"enum": [True, None]}, '{\n    "enum": [True, None]\n}'),
+        # Words inside strings are left alone
+        ({"nullable": "true"}, '{\n    "nullable": "true"\n}'),
+    ])
+    def test_json_to_python_literal(self, obj, expected):
+        """Test conversion of JSON values to Python literals"""
+        assert json_to_python_literal(obj) == expected
+
+    @pytest.mark.parametrize("schema,expected", [
+        ({"type": "string"}, "str"),
+        ({"type": "integer"}, "int"),
+        ({"type": "number"}, "float"),
+        ({"type": "boolean"}, "bool"),
+        ({"type": "string", "enum": ["a", "b", "c"]}, 'Literal["a", "b", "c"]'),
+        ({"type": "array", "items": {"type": "string"}}, "List[str]"),
+        ({"type": "object"}, "Dict[str, Any]"),
+    ])
+    def test_json_schema_to_python_type(self, schema, expected):
+        """Test conversion of JSON schema types to Python type hints"""
+        assert json_schema_to_python_type(schema) == expected
+
+    @pytest.mark.slow
+    def test_mypy_compatibility(self, default_generated):
+        """Test that generated code passes mypy type checking"""
+        mypy_api = pytest.importorskip("mypy.api")
+        output_file, _ = default_generated
 
         # Create a simple test file that uses the generated code
-        test_file = self.test_output_dir / "test_usage.py"
+        test_file = output_file.parent / "test_usage.py"
         test_file.write_text(f"""
-from test_mypy import posthog
+from {output_file.stem} import hogtyped
 
 # This should type check correctly
-posthog.capture(
+hogtyped.capture(
     distinct_id="user-123",
     event="simple_event",
     properties={{
@@ -373,17 +844,10 @@ posthog.capture(
 )
 """)
 
-        # Try to run mypy on the generated code (if available)
-        try:
-            result = subprocess.run(
-                ["python", "-m", "mypy", "--ignore-missing-imports", str(output_file)],
-                capture_output=True,
-                text=True
-            )
-            # We don't fail the test if mypy isn't installed
-            # but if it is, the generated code should pass
-            if result.returncode != 0 and "No module named mypy" not in result.stderr:
-                print(f"MyPy output:\n{result.stdout}\n{result.stderr}")
-        except Exception:
-            # mypy not installed, skip
-            pass
\ No newline at end of file
+        # Run mypy in-process on the generated code and its usage
+        stdout, stderr, status = mypy_api.run(
+            ["--ignore-missing-imports", str(output_file), str(test_file)]
+        )
+        # We don't fail the test on mypy errors, but report them
+        if status != 0:
+            print(f"MyPy output:\n{stdout}\n{stderr}")